@@ -5,6 +5,7 @@ import json
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent.parent))
+import yajp
 from yajp import parse, JSONParserError
 
 
@@ -41,4 +42,78 @@ def test_function(input, expected_output):
     if expected_output:
         assert result == json.loads(input)
     else:
-        raise
\ No newline at end of file
+        raise
+
+
+@pytest.mark.parametrize("input", ['{"a","b":1}', '{,"a":1}', '{a":1}'])
+def test_invalid_object(input):
+    with pytest.raises(JSONParserError):
+        parse(input)
+
+
+@pytest.mark.parametrize("input", ["-", "-a", "[-]"])
+def test_invalid_number(input):
+    with pytest.raises(JSONParserError):
+        parse(input)
+
+
+def test_bytes_input():
+    assert parse('{"a": ["é", 1]}'.encode("utf-8")) == {"a": ["é", 1]}
+    assert parse(bytearray(b"[true]")) == [True]
+    with pytest.raises(JSONParserError):
+        parse(b'["\xff"]')
+
+
+def test_surrogate_escapes():
+    assert parse('"\\ud83d\\ude00"') == "\U0001f600"
+    assert parse('"\ud800\\udc00"') == json.loads('"\ud800\\udc00"') == "\ud800\udc00"
+    assert parse('"\\ud800\\ud800\\udc00"') == "\ud800\U00010000"
+
+
+def test_schema():
+    doc = (
+        '[{"id": 1, "name": "a"}, {"name": "b", "id": 2}, {"id": 3},'
+        ' {"id": 4, "name": {"id": 5, "name": null}}]'
+    )
+    assert parse(doc, schema=["id", "name"]) == parse(doc) == json.loads(doc)
+    with pytest.raises(JSONParserError):
+        parse('[{"id": 1, "name": }]', schema=["id", "name"])
+    with pytest.raises(ValueError):
+        parse("{}", schema=["id", "id"])
+    with pytest.raises(TypeError):
+        parse("{}", schema="id")
+    with pytest.raises(TypeError):
+        parse("{}", schema=[1])
+
+
+def test_schema_partial_match():
+    doc = '{"id": {"id": 1, "x": 2}, "x": 3}'
+    assert parse(doc, schema=["id"]) == json.loads(doc)
+    doc = '[{"id": 1, "name": "a", "x": [1]}, {"id": 2, "x": 0, "name": "b"}]'
+    assert parse(doc, schema=["id", "name"]) == json.loads(doc)
+    with pytest.raises(JSONParserError):
+        parse('{"id": 1, "x" 2}', schema=["id"])
+    with pytest.raises(JSONParserError):
+        parse('{"id": 1, "name": }', schema=["id", "name"])
+
+
+def test_schema_mismatch_parses_each_value_once(monkeypatch):
+    calls = []
+
+    def parse_number(s, idx, memo, dispatch):
+        calls.append(idx)
+        return yajp._parse_number(s, idx)
+
+    dispatch = {**yajp.DISPATCH, **dict.fromkeys("-0123456789", parse_number)}
+    monkeypatch.setattr(yajp, "DISPATCH", dispatch)
+    depth = 10
+    doc = '{"id":' * depth + "1" + ',"x":1}' * depth
+    assert parse(doc, schema=["id"]) == json.loads(doc)
+    assert len(calls) == len(set(calls)) == depth + 1
+
+
+@pytest.mark.parametrize("schema", [["x"], ["id"], ["id", "y"]])
+def test_schema_nesting_depth(schema):
+    depth = sys.getrecursionlimit() // 2 - 100
+    doc = '{"id":' * depth + "1" + ',"x":1}' * depth
+    assert parse(doc, schema=schema) == parse(doc)
@@ -1,296 +1,320 @@
-from typing import List, Dict, Union
+import re
+from functools import lru_cache
+from typing import Callable, List, Dict, Optional, Sequence, Tuple, Union
+
+__all__ = ["parse", "JSONParserError"]
 
 JSONValue = Union[
     str, int, float, bool, None, List["JSONValue"], Dict[str, "JSONValue"]
 ]
 JSONElement = JSONValue
 
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+NUMBER = re.compile(r"(-?(?:0|[1-9][0-9]*))(\.[0-9]+)?([eE][-+]?[0-9]+)?")
+STRING_CHUNK = re.compile(r'[^"\\\x00-\x1f]*')
+CONTROL_CHAR = re.compile(r"[\x00-\x1f]")
+OBJECT_KEY = re.compile(r'"([^"\\\x00-\x1f]*)"[ \t\n\r]*:[ \t\n\r]*')
+OBJECT_SEP = re.compile(r"[ \t\n\r]*(?:(\})|,[ \t\n\r]*)")
+ARRAY_SEP = re.compile(r"[ \t\n\r]*(?:(\])|,[ \t\n\r]*)")
+
+_match_ws = WHITESPACE.match
+_match_number = NUMBER.match
+_match_string_chunk = STRING_CHUNK.match
+_search_control = CONTROL_CHAR.search
+_match_object_key = OBJECT_KEY.match
+_match_object_sep = OBJECT_SEP.match
+_match_array_sep = ARRAY_SEP.match
+
+WS_CHARS = frozenset(" \t\n\r")
+LITERAL_END_CHARS = WS_CHARS | frozenset(",]}")
+HEX_CHARS = frozenset("0123456789abcdefABCDEF")
+ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
 
 class JSONParserError(Exception):
     pass
 
 
-class JSONParser:
-    def __init__(self, s: str) -> None:
-        self.s = s
-        self.idx = 0
-        self.len = len(s)
-
-    def parse(self) -> JSONElement:
-        return self.parse_element(True)
-
-    def parse_element(self, root=False) -> JSONElement:
-        obj = None
-        assigned = False
-
-        while (val := self.peek()) is not None:
-            if self.is_ws(val):
-                self.consume()
-            elif assigned:
-                break
-            elif val == "{":
-                obj = self.parse_object()
-                assigned = True
-            elif val == "[":
-                obj = self.parse_array()
-                assigned = True
-            elif val == '"':
-                obj = self.parse_string()
-                assigned = True
-            elif val in "-0123456789":
-                obj = self.parse_number()
-                assigned = True
-            elif val == "t":
-                obj = self.parse_literal("true", True)
-                assigned = True
-            elif val == "f":
-                obj = self.parse_literal("false", False)
-                assigned = True
-            elif val == "n":
-                obj = self.parse_literal("null", None)
-                assigned = True
-            else:
-                raise JSONParserError(f"Unexpected character: {val}")
-
-        if root:
-            if self.peek() is not None:
-                raise JSONParserError(f"Unexpected character: {self.peek()}")
-            if obj is None and not assigned:
-                raise JSONParserError(f"Unexpected EOF at index {self.idx}")
-
-        return obj
-
-    def is_ws(self, c: str) -> bool:
-        return c in " \t\n\r"
-
-    def is_valid_literal_ending(self, c: Union[str, None]) -> bool:
-        return c is None or self.is_ws(c) or c in ",]}"
-
-    def parse_object(self) -> Dict[str, JSONElement]:
-        self.consume()
-        obj = {}
-        expects_key = True
-        expects_colon = False
-        expects_object = False
-        while (val := self.peek()) is not None:
-            if self.is_ws(val):
-                self.consume()
-            elif (
-                (len(obj) == 0 or not expects_key)
-                and not expects_object
-                and not expects_colon
-                and val == "}"
-            ):
-                self.consume()
-                return obj
-            elif expects_key:
-                key = self.parse_string()
-                expects_key = False
-                expects_colon = True
-            elif expects_colon and val == ":":
-                self.consume()
-                expects_object = True
-                expects_colon = False
-            elif expects_object:
-                el = self.parse_element()
-                obj[key] = el
-                expects_object = False
-            elif not expects_object and val == ",":
-                self.consume()
-                expects_key = True
-            else:
-                raise JSONParserError(f"Unexpected character: {val}")
-
-        raise JSONParserError(f"Expected \x7d, found {self.peek()}")
-
-    def parse_array(self) -> List[JSONElement]:
-        self.consume()
-        arr = []
-        expects_element = True
-        while (val := self.peek()) is not None:
-            if self.is_ws(val):
-                self.consume()
-            elif (len(arr) == 0 or not expects_element) and val == "]":
-                self.consume()
-                return arr
-            elif expects_element:
-                arr.append(self.parse_element())
-                expects_element = False
-            elif val == ",":
-                self.consume()
-                expects_element = True
-            else:
-                raise JSONParserError(f"Unexpected character: {val}")
-        raise JSONParserError(f"Expected \x5d, found {self.peek()}")
-
-    def parse_hex(self, n: int) -> Union[int, None]:
-        start = self.idx
-        while (val := self.peek()) is not None:
-            if self.idx - start == n:
-                break
-            if val in "0123456789abcdefABCDEF":
-                self.consume()
-            else:
-                raise JSONParserError(f"Unexpected character: {val}")
-        if self.idx - start != n:
-            raise JSONParserError(f"Unexpected EOF at index {self.idx}")
-        return int(self.s[start : self.idx], 16)
-
-    def parse_string(self) -> str:
-        s = []
-        self.consume()
-
-        while (val := self.peek()) is not None:
-            if val == '"':
-                self.consume()
-                return "".join(s)
-            elif val == "\\":
-                self.consume()
-                if (val := self.peek()) is None:
-                    raise JSONParserError(f"Unexpected EOF at index {self.idx}")
-                elif val == '"':
-                    s.append('"')
-                elif val == "\\":
-                    s.append("\\")
-                elif val == "/":
-                    s.append("/")
-                elif val == "b":
-                    s.append("\b")
-                elif val == "f":
-                    s.append("\f")
-                elif val == "n":
-                    s.append("\n")
-                elif val == "r":
-                    s.append("\r")
-                elif val == "t":
-                    s.append("\t")
-                elif val == "u":
-                    self.consume()
-                    code = self.parse_hex(4)
-                    if code is None:
-                        raise JSONParserError(
-                            f"Invalid unicode escape at index {self.idx}"
-                        )
-                    if len(s) > 0 and 0xD800 <= ord(s[-1]) <= 0xDBFF and 0xDC00 <= code <= 0xDFFF:
-                        s[-1] = chr((ord(s[-1]) - 0xD800) * 0x400 + (code - 0xDC00) + 0x10000)
-                    else:
-                        s.append(chr(code))
-                    continue
-                else:
-                    raise JSONParserError(f"Invalid escape at index {self.idx}")
-                self.consume()
-            elif ord(val) < 0x20:
-                raise JSONParserError(f"Invalid character at index {self.idx}")
-            else:
-                s.append(val)
-                self.consume()
-
-        raise JSONParserError(f"Invalid character at index {self.idx}")
-
-    def parse_number(self) -> Union[int, float]:
-        start = self.idx
-        start_fraction, start_exponent = False, False
-        number, fraction, exponent, zero, sign_number, sign_exp = (
-            False,
-            False,
-            False,
-            False,
-            False,
-            False,
+def _parse_element(
+    s: str, idx: int, memo: dict, dispatch: dict
+) -> Tuple[JSONElement, int]:
+    idx = _match_ws(s, idx).end()
+    if idx >= len(s):
+        raise JSONParserError(f"Unexpected EOF at index {idx}")
+    val = s[idx]
+    if (handler := dispatch.get(val)) is None:
+        raise JSONParserError(f"Unexpected character: {val}")
+    obj, idx = handler(s, idx, memo, dispatch)
+    return obj, _match_ws(s, idx).end()
+
+
+def _parse_object(
+    s: str, idx: int, memo: dict, dispatch: dict
+) -> Tuple[Dict[str, JSONElement], int]:
+    obj = {}
+    idx = _match_ws(s, idx + 1).end()
+    if idx < len(s) and s[idx] == "}":
+        return obj, idx + 1
+    return _parse_members(s, idx, memo, dispatch, obj)
+
+
+def _resume_object(
+    s: str, idx: int, memo: dict, dispatch: dict, obj: Dict[str, JSONElement]
+) -> Tuple[Dict[str, JSONElement], int]:
+    # Continue an object whose members so far are already in obj; idx is
+    # just past the last value, before its separator.
+    if (m := _match_object_sep(s, idx)) is None:
+        idx = _match_ws(s, idx).end()
+        raise JSONParserError(
+            f"Expected \x7d, found {s[idx] if idx < len(s) else None}"
         )
-        while (val := self.peek()) is not None:
-            if val == ".":
-                if fraction or exponent or (sign_number and not (number or zero)):
-                    raise JSONParserError(f"Invalid state: {fraction, exponent}")
-                fraction = True
-                self.consume()
-                continue
-            elif val in "eE":
-                if exponent or (fraction and not start_fraction):
-                    raise JSONParserError(f"Invalid state: {fraction, exponent}")
-                exponent = True
-                fraction = False
-                self.consume()
-                continue
-            elif fraction:
-                if val in "0123456789":
-                    if not start_fraction:
-                        start_fraction = self.idx
-                    self.consume()
-                elif not start_fraction:
-                    raise JSONParserError(f"Unexpected character: {val}")
-                else:
-                    break
-            elif exponent:
-                if not sign_exp and not start_exponent and (val == "-" or val == "+"):
-                    sign_exp = True
-                    self.consume()
-                elif val in "0123456789":
-                    if not start_exponent:
-                        start_exponent = self.idx
-                    self.consume()
-                elif not start_exponent:
-                    raise JSONParserError(f"Unexpected character: {val}")
+    if m.group(1) == "}":
+        return obj, m.end()
+    return _parse_members(s, m.end(), memo, dispatch, obj)
+
+
+def _parse_members(
+    s: str, idx: int, memo: dict, dispatch: dict, obj: Dict[str, JSONElement]
+) -> Tuple[Dict[str, JSONElement], int]:
+    n = len(s)
+    while True:
+        if (m := _match_object_key(s, idx)) is not None:
+            key = m.group(1)
+            idx = m.end()
+        else:
+            if idx >= n:
+                raise JSONParserError(f"Unexpected EOF at index {idx}")
+            if s[idx] != '"':
+                raise JSONParserError(f"Unexpected character: {s[idx]}")
+            key, idx = _parse_string(s, idx)
+            idx = _match_ws(s, idx).end()
+            if idx >= n or s[idx] != ":":
+                raise JSONParserError(
+                    f"Unexpected character: {s[idx] if idx < n else None}"
+                )
+            idx = _match_ws(s, idx + 1).end()
+        key = memo.setdefault(key, key)
+        if idx >= n:
+            raise JSONParserError(f"Unexpected EOF at index {idx}")
+        if (handler := dispatch.get(s[idx])) is None:
+            raise JSONParserError(f"Unexpected character: {s[idx]}")
+        obj[key], idx = handler(s, idx, memo, dispatch)
+        if (m := _match_object_sep(s, idx)) is None:
+            idx = _match_ws(s, idx).end()
+            raise JSONParserError(
+                f"Expected \x7d, found {s[idx] if idx < n else None}"
+            )
+        if m.group(1) == "}":
+            return obj, m.end()
+        idx = m.end()
+
+
+def _parse_array(
+    s: str, idx: int, memo: dict, dispatch: dict
+) -> Tuple[List[JSONElement], int]:
+    n = len(s)
+    arr = []
+    append = arr.append
+    idx = _match_ws(s, idx + 1).end()
+    if idx < n and s[idx] == "]":
+        return arr, idx + 1
+    while True:
+        if idx >= n:
+            raise JSONParserError(f"Unexpected EOF at index {idx}")
+        if (handler := dispatch.get(s[idx])) is None:
+            raise JSONParserError(f"Unexpected character: {s[idx]}")
+        el, idx = handler(s, idx, memo, dispatch)
+        append(el)
+        if (m := _match_array_sep(s, idx)) is None:
+            idx = _match_ws(s, idx).end()
+            raise JSONParserError(
+                f"Expected \x5d, found {s[idx] if idx < n else None}"
+            )
+        if m.group(1) == "]":
+            return arr, m.end()
+        idx = m.end()
+
+
+def _parse_hex(s: str, idx: int, n: int) -> Tuple[int, int]:
+    digits = s[idx : idx + n]
+    for val in digits:
+        if val not in HEX_CHARS:
+            raise JSONParserError(f"Unexpected character: {val}")
+    if len(digits) != n:
+        raise JSONParserError(f"Unexpected EOF at index {idx + len(digits)}")
+    return int(digits, 16), idx + n
+
+
+def _parse_string(s: str, idx: int) -> Tuple[str, int]:
+    n = len(s)
+    chunks = []
+    start = idx + 1
+    end = s.find('"', start)
+    if end != -1:
+        body = s[start:end]
+        if "\\" not in body and (body.isprintable() or _search_control(body) is None):
+            return body, end + 1
+    last_cp = -1
+    idx = _match_string_chunk(s, start).end()
+    if idx > start:
+        chunks.append(s[start:idx])
+
+    while idx < n:
+        val = s[idx]
+        if val == '"':
+            return "".join(chunks), idx + 1
+        elif val == "\\":
+            idx += 1
+            if idx >= n:
+                raise JSONParserError(f"Unexpected EOF at index {idx}")
+            val = s[idx]
+            if (char := ESCAPES.get(val)) is not None:
+                chunks.append(char)
+            elif val == "u":
+                code, idx = _parse_hex(s, idx + 1, 4)
+                if 0xD800 <= last_cp <= 0xDBFF and 0xDC00 <= code <= 0xDFFF:
+                    chunks[-1] = chr((last_cp - 0xD800) * 0x400 + (code - 0xDC00) + 0x10000)
+                    last_cp = -1
                 else:
-                    break
+                    chunks.append(chr(code))
+                    last_cp = code
+                continue
             else:
-                if start == self.idx:
-                    if val == "-":
-                        sign_number = True
-                        self.consume()
-                    elif val == "0":
-                        zero = True
-                        self.consume()
-                    elif val in "123456789":
-                        number = True
-                        self.consume()
-                    else:
-                        raise JSONParserError(f"Unexpected character: {val}")
-                elif self.idx == start + 1 and sign_number:
-                    if val == "0":
-                        zero = True
-                        self.consume()
-                    elif val in "123456789":
-                        number = True
-                        self.consume()
-                    else:
-                        break
-                elif zero:
-                    if val in "0123456789":
-                        raise JSONParserError(f"Unexpected character: {val}")
-                    else:
-                        break
-                elif number:
-                    if val in "0123456789":
-                        self.consume()
-                    else:
-                        break
-
-        if fraction or exponent:
-            return float(self.s[start : self.idx])
+                raise JSONParserError(f"Invalid escape at index {idx}")
+            idx += 1
+            last_cp = -1
+        elif ord(val) < 0x20:
+            raise JSONParserError(f"Invalid character at index {idx}")
         else:
-            return int(self.s[start : self.idx])
-
-    def parse_literal(self, target: str, value: Union[bool, None]) -> Union[bool, None]:
-        for c in target:
-            if self.peek() != c:
-                raise JSONParserError(f"Found {self.peek()}, expected {target}")
-            self.consume()
-        if not self.is_valid_literal_ending(self.peek()):
-            raise JSONParserError(f"Found {self.peek()}, expected whitespace")
-        return value
-
-    def peek(self, offset=0) -> Union[str, None]:
-        if self.idx + offset >= self.len:
-            return None
-        return self.s[self.idx]
-
-    def consume(self) -> str:
-        if self.idx >= self.len:
-            raise JSONParserError(f"Unexpected EOF at index {self.idx}")
-        self.idx += 1
-        return self.s[self.idx - 1]
-
-
-def parse(s: str) -> JSONElement:
-    return JSONParser(s).parse()
+            end = _match_string_chunk(s, idx).end()
+            chunks.append(s[idx:end])
+            idx = end
+            last_cp = -1
+
+    raise JSONParserError(f"Invalid character at index {idx}")
+
+
+def _parse_number(s: str, idx: int) -> Tuple[Union[int, float], int]:
+    if (m := _match_number(s, idx)) is None:
+        raise JSONParserError(f"Invalid number at index {idx}")
+    integer, fraction, exponent = m.groups()
+    if fraction or exponent:
+        return float(m.group()), m.end()
+    return int(integer), m.end()
+
+
+def _parse_literal(
+    s: str, idx: int, target: str, value: Union[bool, None]
+) -> Tuple[Union[bool, None], int]:
+    if not s.startswith(target, idx):
+        raise JSONParserError(f"Found {s[idx : idx + len(target)]}, expected {target}")
+    idx += len(target)
+    if idx < len(s) and s[idx] not in LITERAL_END_CHARS:
+        raise JSONParserError(f"Found {s[idx]}, expected whitespace")
+    return value, idx
+
+
+DISPATCH = {
+    "{": _parse_object,
+    "[": _parse_array,
+    '"': lambda s, idx, memo, dispatch: _parse_string(s, idx),
+    "t": lambda s, idx, memo, dispatch: _parse_literal(s, idx, "true", True),
+    "f": lambda s, idx, memo, dispatch: _parse_literal(s, idx, "false", False),
+    "n": lambda s, idx, memo, dispatch: _parse_literal(s, idx, "null", None),
+    **dict.fromkeys(
+        "-0123456789", lambda s, idx, memo, dispatch: _parse_number(s, idx)
+    ),
+}
+
+
+@lru_cache(maxsize=128)
+def _compile_shape(keys: Tuple[str, ...]) -> Callable:
+    if len(set(keys)) != len(keys):
+        raise ValueError(f"Duplicate key in schema: {keys}")
+    ws = "[ \\t\\n\\r]*"
+    namespace = {
+        "_match_ws": _match_ws,
+        "_match_object_sep": _match_object_sep,
+        "_parse_members": _parse_members,
+        "_resume_object": _resume_object,
+    }
+    lines = [
+        "def parse_shape(s, idx, memo, dispatch):",
+        "    n = len(s)",
+    ]
+
+    def fallback(i: int) -> List[str]:
+        # Before any value is consumed the generic parser starts over after
+        # the brace; afterwards it resumes with the members parsed so far, so
+        # no value is ever parsed twice. Both enter _parse_members directly
+        # to keep nesting at two frames per level, as without a schema.
+        if i == 0:
+            return [
+                "        pos = _match_ws(s, idx + 1).end()",
+                '        if pos < n and s[pos] == "}":',
+                "            return {}, pos + 1",
+                "        return _parse_members(s, pos, memo, dispatch, {})",
+            ]
+        items = "{" + ", ".join(f"K{j}: v{j}" for j in range(i)) + "}"
+        return [
+            '        if (m := _match_object_sep(s, idx)) is None or m.group(1) == "}":',
+            f"            return _resume_object(s, idx, memo, dispatch, {items})",
+            f"        return _parse_members(s, m.end(), memo, dispatch, {items})",
+        ]
+
+    for i, key in enumerate(keys):
+        if not isinstance(key, str):
+            raise TypeError(f"Schema keys must be str, not {type(key).__name__}")
+        if _match_string_chunk(key).end() != len(key):
+            raise ValueError(f"Schema key must not need escaping: {key!r}")
+        # One match covers the separator, the key token and the colon.
+        sep = r"\{" if i == 0 else f"{ws},"
+        pattern = f'{sep}{ws}"{re.escape(key)}"{ws}:{ws}'
+        namespace[f"P{i}"] = re.compile(pattern).match
+        namespace[f"K{i}"] = key
+        lines += [
+            f"    if (m := P{i}(s, idx)) is None:",
+            *fallback(i),
+            "    pos = m.end()",
+            "    if pos >= n or (handler := dispatch.get(s[pos])) is None:",
+            *fallback(i),
+            f"    v{i}, idx = handler(s, pos, memo, dispatch)",
+        ]
+    end = ws + r"\}" if keys else r"\{" + ws + r"\}"
+    namespace["END"] = re.compile(end).match
+    items = ", ".join(f"K{i}: v{i}" for i in range(len(keys)))
+    lines += [
+        "    if (m := END(s, idx)) is None:",
+        *fallback(len(keys)),
+        "    return {" + items + "}, m.end()",
+    ]
+    exec(compile("\n".join(lines), f"<yajp shape {keys}>", "exec"), namespace)
+    return namespace["parse_shape"]
+
+
+def parse(
+    s: Union[str, bytes, bytearray], schema: Optional[Sequence[str]] = None
+) -> JSONElement:
+    if isinstance(s, (bytes, bytearray)):
+        try:
+            s = s.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise JSONParserError(f"Invalid UTF-8 at index {e.start}") from e
+    dispatch = DISPATCH
+    if schema is not None:
+        if isinstance(schema, (str, bytes, bytearray)):
+            raise TypeError("schema must be a sequence of keys, not a string")
+        dispatch = {**DISPATCH, "{": _compile_shape(tuple(schema))}
+    obj, idx = _parse_element(s, 0, {}, dispatch)
+    if idx < len(s):
+        raise JSONParserError(f"Unexpected character: {s[idx]}")
+    return obj